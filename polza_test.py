@@ -1,21 +1,45 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import base64
+import errno
+import http.client
 import json
+import mmap
 import os
-import socket
+import re
+import smtplib
+import stat
 import sys
 import time
 import urllib.parse
 import urllib.request
 from dataclasses import dataclass
 from email.utils import parseaddr
-from typing import Iterable, Optional
+from typing import Awaitable, BinaryIO, Iterable, Iterator, Optional, TypeVar
 
+import dns.asyncresolver
 import dns.exception
+import dns.name
 import dns.resolver
 
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
 
-@dataclass(frozen=True)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+@dataclass(frozen=True, slots=True)
 class EmailCheckResult:
     email: str
     status: str
@@ -24,24 +48,146 @@ class EmailCheckResult:
     smtp_result: str
 
 
-def _make_resolver(timeout_s: float) -> dns.resolver.Resolver:
+T = TypeVar("T")
+
+_DNS_CONCURRENCY = 100
+_FLUSH_EVERY = 256
+_RESULT_FMT = "{}\t{}\tmx=[{}]\tsmtp={}\n".format
+
+_ACCEPT_ALL_DOMAINS = frozenset(
+    {
+        "gmail.com",
+        "googlemail.com",
+        "outlook.com",
+        "hotmail.com",
+        "live.com",
+        "msn.com",
+        "yahoo.com",
+        "icloud.com",
+        "me.com",
+        "yandex.ru",
+        "ya.ru",
+        "mail.ru",
+        "bk.ru",
+        "inbox.ru",
+        "list.ru",
+        "rambler.ru",
+    }
+)
+
+_DOMAIN_CACHE: dict[str, bool] = {}
+_MX_CACHE: dict[str, tuple[str, ...]] = {}
+_NX_CACHE: set[str] = set()
+_TIMEOUT_CACHE: dict[str, float] = {}
+
+_TIMEOUT_CACHE_TTL_S = 30.0
+_DNS_RETRY_BACKOFF_S = 0.5
+_FALLBACK_NAMESERVERS = ["8.8.8.8", "1.1.1.1"]
+
+_EMAIL_RE = re.compile(
+    r"""[\s<>"'\[\](){}.,;:]*([^\s<>"'\[\](){}.,;:@][^\s<>"'\[\](){},;:@]*@[^\s<>"'\[\](){}.,;:@][^\s<>"'\[\](){},;:@]*?)[\s<>"'\[\](){}.,;:]*"""
+)
+
+_EMAIL_SPECIALS = frozenset(" \t\r\n\f\v<>\"'[](){},;:")
+
+_RESOLVER: Optional[dns.asyncresolver.Resolver] = None
+_FALLBACK_RESOLVER: Optional[dns.asyncresolver.Resolver] = None
+_AIODNS_RESOLVER = None
+
+_TG_HOST = "api.telegram.org"
+_TG_CONN: Optional[http.client.HTTPSConnection] = None
+
+
+def _make_resolver(timeout_s: float) -> dns.asyncresolver.Resolver:
     try:
-        resolver = dns.resolver.Resolver(configure=True)
+        resolver = dns.asyncresolver.Resolver(configure=True)
     except dns.resolver.NoResolverConfiguration:
-        resolver = dns.resolver.Resolver(configure=False)
+        resolver = dns.asyncresolver.Resolver(configure=False)
         resolver.nameservers = ["1.1.1.1", "8.8.8.8"]
 
     resolver.lifetime = timeout_s
     return resolver
 
 
+def _get_resolver(timeout_s: float) -> dns.asyncresolver.Resolver:
+    global _RESOLVER
+
+    if _RESOLVER is None:
+        _RESOLVER = _make_resolver(timeout_s=timeout_s)
+        _RESOLVER.cache = dns.resolver.LRUCache(10000)
+
+    _RESOLVER.lifetime = timeout_s
+    return _RESOLVER
+
+
+def _get_fallback_resolver(timeout_s: float) -> dns.asyncresolver.Resolver:
+    global _FALLBACK_RESOLVER
+
+    if _FALLBACK_RESOLVER is None:
+        _FALLBACK_RESOLVER = dns.asyncresolver.Resolver(configure=False)
+        _FALLBACK_RESOLVER.nameservers = _FALLBACK_NAMESERVERS
+
+    _FALLBACK_RESOLVER.lifetime = timeout_s
+    return _FALLBACK_RESOLVER
+
+
+def _get_aiodns_resolver(timeout_s: float) -> "aiodns.DNSResolver":
+    global _AIODNS_RESOLVER
+
+    loop = asyncio.get_running_loop()
+    if _AIODNS_RESOLVER is None or _AIODNS_RESOLVER.loop is not loop:
+        _AIODNS_RESOLVER = aiodns.DNSResolver(loop=loop, timeout=timeout_s, tries=1)
+
+    return _AIODNS_RESOLVER
+
+
+async def _query(domain: str, rtype: str, timeout_s: float, fallback: bool = False) -> list:
+    if fallback or aiodns is None:
+        resolver = _get_fallback_resolver(timeout_s) if fallback else _get_resolver(timeout_s)
+        answers = await resolver.resolve(domain, rtype)
+        if rtype == "MX":
+            return [(rdata.preference, str(rdata.exchange)) for rdata in answers]
+        return list(answers)
+
+    resolver = _get_aiodns_resolver(timeout_s=timeout_s)
+
+    try:
+        if hasattr(resolver, "query_dns"):
+            result = await resolver.query_dns(domain, rtype)
+            answers = [rr.data for rr in result.answer]
+        else:
+            answers = await resolver.query(domain, rtype)
+    except aiodns.error.DNSError as e:
+        code = e.args[0] if e.args else None
+        if code in (aiodns.error.ARES_ENOTFOUND, aiodns.error.ARES_ENONAME):
+            raise dns.resolver.NXDOMAIN() from e
+        if code == aiodns.error.ARES_ENODATA:
+            raise dns.resolver.NoAnswer() from e
+        if code == aiodns.error.ARES_ETIMEOUT:
+            raise dns.exception.Timeout() from e
+        raise dns.resolver.NoNameservers() from e
+
+    if rtype == "MX":
+        return [(r.priority, getattr(r, "exchange", None) or r.host) for r in answers if hasattr(r, "priority")]
+    return answers
+
+
 def _extract_email(raw: str) -> Optional[str]:
-    raw = raw.strip()
-    if not raw:
+    if "@" not in raw:
         return None
 
-    _, addr = parseaddr(raw)
-    addr = (addr or raw).strip()
+    s = raw.strip()
+    if s[0].isalnum() and s[-1].isalnum():
+        local, _, domain = s.rpartition("@")
+        if local and domain and "@" not in local and s.isprintable() and _EMAIL_SPECIALS.isdisjoint(s):
+            return s.lower()
+
+    m = _EMAIL_RE.fullmatch(s)
+    if m:
+        return m.group(1).lower()
+
+    _, addr = parseaddr(s)
+    addr = (addr or s).strip()
     addr = addr.strip("\"'<>[](){}.,;:")
 
     if "@" not in addr:
@@ -54,155 +200,471 @@ def _extract_email(raw: str) -> Optional[str]:
     return f"{local}@{domain}".lower()
 
 
-def _domain_exists(domain: str, timeout_s: float) -> bool:
-    resolver = _make_resolver(timeout_s=timeout_s)
+async def resolve_domain(domain: str, timeout_s: float) -> tuple[Optional[bool], tuple[str, ...]]:
+    if domain in _NX_CACHE:
+        return False, tuple()
+
+    if domain in _DOMAIN_CACHE and domain in _MX_CACHE:
+        return _DOMAIN_CACHE[domain], _MX_CACHE[domain]
+
+    if _TIMEOUT_CACHE.get(domain, 0.0) > time.monotonic():
+        return None, tuple()
 
     try:
-        resolver.resolve(domain, "A")
-        return True
-    except dns.resolver.NXDOMAIN:
-        return False
-    except (dns.resolver.NoAnswer, dns.resolver.NoNameservers, dns.exception.Timeout):
-        try:
-            resolver.resolve(domain, "AAAA")
-            return True
-        except dns.resolver.NXDOMAIN:
-            return False
-        except (dns.resolver.NoAnswer, dns.resolver.NoNameservers, dns.exception.Timeout):
-            return True
+        qname = dns.name.from_text(domain).to_text(omit_final_dot=True)
+    except dns.exception.DNSException:
+        _NX_CACHE.add(domain)
+        return False, tuple()
+
+    rtypes = ("A", "AAAA", "MX")
+    answers = dict(
+        zip(
+            rtypes,
+            await asyncio.gather(*(_query(qname, t, timeout_s=timeout_s) for t in rtypes), return_exceptions=True),
+        )
+    )
 
+    if any(isinstance(r, dns.resolver.NXDOMAIN) for r in answers.values()):
+        _NX_CACHE.add(domain)
+        return False, tuple()
+
+    if isinstance(answers["MX"], dns.exception.Timeout):
+        timed_out = [t for t in rtypes if isinstance(answers[t], dns.exception.Timeout)]
+        await asyncio.sleep(_DNS_RETRY_BACKOFF_S)
+        retried = dict(
+            zip(
+                timed_out,
+                await asyncio.gather(
+                    *(_query(qname, t, timeout_s=timeout_s, fallback=True) for t in timed_out), return_exceptions=True
+                ),
+            )
+        )
 
-def _resolve_mx(domain: str, timeout_s: float) -> tuple[str, ...]:
-    resolver = _make_resolver(timeout_s=timeout_s)
+        if any(isinstance(r, dns.resolver.NXDOMAIN) for r in retried.values()):
+            if len(timed_out) < len(rtypes):
+                _TIMEOUT_CACHE[domain] = time.monotonic() + _TIMEOUT_CACHE_TTL_S
+                return None, tuple()
+            _NX_CACHE.add(domain)
+            return False, tuple()
 
-    try:
-        answers = resolver.resolve(domain, "MX")
-    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.NoNameservers, dns.exception.Timeout):
-        return tuple()
+        answers.update(retried)
+
+    for r in answers.values():
+        if isinstance(r, BaseException) and not isinstance(r, dns.exception.DNSException):
+            raise r
+
+    mx_answers = answers["MX"]
+    if isinstance(mx_answers, dns.exception.Timeout):
+        _TIMEOUT_CACHE[domain] = time.monotonic() + _TIMEOUT_CACHE_TTL_S
+        return None, tuple()
+
+    _DOMAIN_CACHE[domain] = True
 
     mx = []
-    for rdata in answers:
-        host = str(rdata.exchange).rstrip(".").lower()
-        if host:
-            mx.append((rdata.preference, host))
+    if not isinstance(mx_answers, BaseException):
+        for preference, exchange in mx_answers:
+            host = exchange.rstrip(".").lower()
+            if host:
+                mx.append((preference, host))
 
     mx.sort(key=lambda x: x[0])
-    return tuple(h for _, h in mx)
+    _MX_CACHE[domain] = tuple(h for _, h in mx)
+    return True, _MX_CACHE[domain]
 
 
-def _smtp_handshake_check(
-    email: str,
-    mx_hosts: Iterable[str],
-    timeout_s: float,
-    helo_host: str,
-    mail_from: str,
-) -> str:
-    import smtplib
+def _rcpt_code_to_result(code: Optional[int]) -> str:
+    if code is None:
+        return "unknown"
+
+    if 200 <= code < 300:
+        return "accepted"
+
+    if 500 <= code < 600:
+        return "rejected"
+
+    return "unknown"
+
+
+def _smtp_host(host: str) -> Optional[str]:
+    if not host or "\r" in host or "\n" in host:
+        return None
+
+    try:
+        return host.encode("idna").decode("ascii")
+    except UnicodeError:
+        return None
+
+
+def _smtp_address(email: str) -> Optional[str]:
+    local, at, domain = email.rpartition("@")
+    if not at or not local.isascii() or "\r" in local or "\n" in local:
+        return None
+
+    domain = _smtp_host(domain)
+    if domain is None:
+        return None
+
+    return f"{local}@{domain}"
+
+
+def _rcpt_cmd(email: str) -> Optional[bytes]:
+    addr = _smtp_address(email)
+    if addr is None:
+        return None
+
+    return b"RCPT TO:<%s>\r\n" % addr.encode("ascii")
+
+
+_RSET_CMD = b"RSET\r\n"
+_QUIT_CMD = b"QUIT\r\n"
+
+
+class _SMTPConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, timeout_s: float) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.timeout_s = timeout_s
+        self.rcpts = 0
+        self.idle_since = 0.0
+
+    async def _read_reply(self) -> int:
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            if line[3:4] != b"-":
+                return int(line[:3])
+
+    async def read_reply(self) -> int:
+        return await asyncio.wait_for(self._read_reply(), self.timeout_s)
+
+    async def command(self, line: bytes) -> int:
+        self.writer.write(line)
+        await asyncio.wait_for(self.writer.drain(), self.timeout_s)
+        return await self.read_reply()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class SMTPPool:
+    def __init__(
+        self,
+        timeout_s: float,
+        helo_host: str,
+        mail_from: str,
+        max_rcpts: int = 100,
+        max_connections: int = 32,
+        max_connections_per_host: int = 2,
+        max_idle: int = 16,
+        max_idle_per_host: int = 2,
+        idle_timeout_s: float = 30.0,
+        rcpt_delay_s: float = 0.0,
+    ) -> None:
+        self.timeout_s = timeout_s
+        self.helo_host = helo_host
+        self.mail_from = mail_from
+        self.max_rcpts = max_rcpts
+        self.max_connections_per_host = max(1, max_connections_per_host)
+        self.max_idle = max_idle
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout_s = idle_timeout_s
+        self.rcpt_delay_s = rcpt_delay_s
+        self._ehlo_cmd = f"EHLO {helo_host}\r\n".encode("ascii")
+        self._helo_cmd = f"HELO {helo_host}\r\n".encode("ascii")
+        self._mail_cmd = f"MAIL FROM:<{mail_from}>\r\n".encode("ascii")
+        self._idle: dict[str, list[_SMTPConnection]] = {}
+        self._sem = asyncio.Semaphore(max_connections)
+        self._host_sems: dict[str, asyncio.Semaphore] = {}
+
+    async def _connect(self, host: str) -> _SMTPConnection:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, 25), self.timeout_s)
+        conn = _SMTPConnection(reader, writer, self.timeout_s)
+
+        try:
+            code = await conn.read_reply()
+            if code != 220:
+                raise smtplib.SMTPConnectError(code, b"")
+
+            code = await conn.command(self._ehlo_cmd)
+            if code >= 400:
+                code = await conn.command(self._helo_cmd)
+            if code >= 400:
+                raise smtplib.SMTPHeloError(code, b"")
+        except BaseException:
+            conn.close()
+            raise
+
+        return conn
+
+    def _idle_count(self) -> int:
+        return sum(len(conns) for conns in self._idle.values())
+
+    async def _expire_idle(self) -> None:
+        deadline = time.monotonic() - self.idle_timeout_s
+        expired = []
+
+        for host in list(self._idle):
+            conns = self._idle[host]
+            while conns and conns[0].idle_since <= deadline:
+                expired.append(conns.pop(0))
+            if not conns:
+                del self._idle[host]
+
+        await asyncio.gather(*(self._quit(conn) for conn in expired))
+
+    async def _evict_oldest(self) -> None:
+        host = min(self._idle, key=lambda h: self._idle[h][0].idle_since)
+        conn = self._idle[host].pop(0)
+        if not self._idle[host]:
+            del self._idle[host]
+        await self._quit(conn)
+
+    async def _acquire(self, host: str) -> _SMTPConnection:
+        await self._expire_idle()
+
+        idle = self._idle.get(host)
+        if idle:
+            conn = idle.pop()
+            if not idle:
+                del self._idle[host]
+            return conn
+
+        try:
+            return await self._connect(host)
+        except OSError as e:
+            if e.errno != errno.EMFILE or not self._idle:
+                raise
+
+        await self._drop_idle()
+        return await self._connect(host)
+
+    async def _drop_idle(self) -> None:
+        idle, self._idle = self._idle, {}
+
+        conns = [conn for host_conns in idle.values() for conn in host_conns]
+        for conn in conns:
+            conn.close()
+        await asyncio.gather(*(conn.writer.wait_closed() for conn in conns), return_exceptions=True)
 
-    last_error: Optional[str] = None
+    async def _release(self, host: str, conn: _SMTPConnection) -> None:
+        if conn.rcpts >= self.max_rcpts or self.max_idle_per_host < 1 or self.max_idle < 1:
+            await self._quit(conn)
+            return
 
-    for host in mx_hosts:
+        await self._expire_idle()
+
+        conns = self._idle.get(host, [])
+        if len(conns) >= self.max_idle_per_host:
+            oldest = conns.pop(0)
+            await self._quit(oldest)
+
+        while self._idle_count() >= self.max_idle:
+            await self._evict_oldest()
+
+        conn.idle_since = time.monotonic()
+        self._idle.setdefault(host, []).append(conn)
+
+    @staticmethod
+    async def _quit(conn: _SMTPConnection) -> None:
         try:
-            with smtplib.SMTP(host=host, port=25, timeout=timeout_s) as smtp:
-                smtp.set_debuglevel(0)
-                smtp.ehlo_or_helo_if_needed()
-
-                try:
-                    smtp.helo(name=helo_host)
-                except smtplib.SMTPHeloError:
-                    pass
-
-                code, _ = smtp.mail(mail_from)
-                if code and code >= 400:
-                    last_error = f"MAIL FROM rejected ({code})"
+            await conn.command(_QUIT_CMD)
+        except (OSError, asyncio.TimeoutError, ValueError, smtplib.SMTPException):
+            pass
+        conn.close()
+
+    async def _check_many_on_host(
+        self, host: str, addresses: list[str], rcpt_cmds: dict[str, bytes], results: dict[str, str]
+    ) -> None:
+        i = 0
+        while i < len(addresses):
+            conn = await self._acquire(host)
+            pooled = conn.rcpts > 0
+            start = i
+
+            try:
+                if pooled:
+                    await conn.command(_RSET_CMD)
+
+                code = await conn.command(self._mail_cmd)
+                if code >= 400:
+                    await self._release(host, conn)
+                    return
+
+                while i < len(addresses) and conn.rcpts < self.max_rcpts:
+                    code = await conn.command(rcpt_cmds[addresses[i]])
+                    results[addresses[i]] = _rcpt_code_to_result(code)
+                    conn.rcpts += 1
+                    i += 1
+                    if self.rcpt_delay_s > 0 and i < len(addresses):
+                        await asyncio.sleep(self.rcpt_delay_s)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                conn.close()
+                if pooled and i == start:
                     continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
 
-                code, _ = smtp.rcpt(email)
+            await self._release(host, conn)
 
-                if code is None:
-                    return "unknown"
+    async def check_many(self, mx_hosts: Iterable[str], addresses: list[str]) -> dict[str, str]:
+        results: dict[str, str] = {}
+        rcpt_cmds: dict[str, bytes] = {}
 
-                if 200 <= code < 300:
-                    return "accepted"
+        for addr in addresses:
+            cmd = _rcpt_cmd(addr)
+            if cmd is None:
+                results[addr] = "unknown"
+            else:
+                rcpt_cmds[addr] = cmd
 
-                if 500 <= code < 600:
-                    return "rejected"
+        pending = [a for a in addresses if a not in results]
 
-                return "unknown"
+        for host in mx_hosts:
+            if not pending:
+                break
 
-        except (socket.timeout, OSError, smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected) as e:
-            last_error = f"connect error: {e.__class__.__name__}"
-            continue
-        except smtplib.SMTPException as e:
-            last_error = f"smtp error: {e.__class__.__name__}"
-            continue
+            host_sem = self._host_sems.get(host)
+            if host_sem is None:
+                host_sem = self._host_sems[host] = asyncio.Semaphore(self.max_connections_per_host)
 
-    if last_error:
-        return "unknown"
+            try:
+                async with host_sem, self._sem:
+                    await self._check_many_on_host(host, pending, rcpt_cmds, results)
+            except (OSError, asyncio.TimeoutError, ValueError, smtplib.SMTPException):
+                pass
 
-    return "unknown"
+            pending = [a for a in pending if a not in results]
+
+        for addr in pending:
+            results[addr] = "unknown"
+
+        return results
+
+    async def check(self, email: str, mx_hosts: Iterable[str]) -> str:
+        return (await self.check_many(mx_hosts, [email]))[email]
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, {}
+
+        await asyncio.gather(*(self._quit(conn) for conns in idle.values() for conn in conns))
+
+
+async def check_domain(
+    domain: str,
+    addresses: list[str],
+    dns_timeout_s: float,
+    smtp_pool: Optional[SMTPPool],
+) -> list[EmailCheckResult]:
+    exists, mx_hosts = await resolve_domain(domain, timeout_s=dns_timeout_s)
+    if exists is None:
+        status = "DNS не ответил (таймаут)"
+    elif not exists:
+        status = "домен отсутствует"
+    elif not mx_hosts:
+        status = "MX-записи отсутствуют или некорректны"
+    else:
+        status = "домен валиден"
+
+    smtp_results: dict[str, str] = {}
+    if status == "домен валиден" and smtp_pool is not None and domain in _ACCEPT_ALL_DOMAINS:
+        smtp_results = dict.fromkeys(addresses, "accepted-provider")
+    elif status == "домен валиден" and smtp_pool is not None:
+        batches = [addresses[i : i + smtp_pool.max_rcpts] for i in range(0, len(addresses), smtp_pool.max_rcpts)]
+        for batch_results in await asyncio.gather(
+            *(smtp_pool.check_many(mx_hosts, batch) for batch in batches)
+        ):
+            smtp_results.update(batch_results)
+
+    return [
+        EmailCheckResult(
+            email=email,
+            status=status,
+            domain=domain,
+            mx_hosts=mx_hosts,
+            smtp_result=smtp_results.get(email, "skipped"),
+        )
+        for email in addresses
+    ]
 
 
-def check_email(
+async def check_email(
     email: str,
     dns_timeout_s: float,
-    smtp_timeout_s: float,
-    helo_host: str,
-    mail_from: str,
-    do_smtp: bool,
+    smtp_pool: Optional[SMTPPool],
 ) -> EmailCheckResult:
     _, domain = email.rsplit("@", 1)
+    results = await check_domain(domain, [email], dns_timeout_s=dns_timeout_s, smtp_pool=smtp_pool)
+    return results[0]
 
-    if not _domain_exists(domain, timeout_s=dns_timeout_s):
-        return EmailCheckResult(
-            email=email,
-            status="домен отсутствует",
-            domain=domain,
-            mx_hosts=tuple(),
-            smtp_result="skipped",
-        )
 
-    mx_hosts = _resolve_mx(domain, timeout_s=dns_timeout_s)
-    if not mx_hosts:
-        return EmailCheckResult(
-            email=email,
-            status="MX-записи отсутствуют или некорректны",
-            domain=domain,
-            mx_hosts=tuple(),
-            smtp_result="skipped",
-        )
+def _iter_lines(f: BinaryIO) -> Iterator[bytes]:
+    st = os.fstat(f.fileno())
+    if not stat.S_ISREG(st.st_mode):
+        yield from f
+        return
 
-    smtp_result = "skipped"
-    if do_smtp:
-        smtp_result = _smtp_handshake_check(
-            email=email,
-            mx_hosts=mx_hosts,
-            timeout_s=smtp_timeout_s,
-            helo_host=helo_host,
-            mail_from=mail_from,
-        )
+    if st.st_size == 0:
+        return
 
-    return EmailCheckResult(
-        email=email,
-        status="домен валиден",
-        domain=domain,
-        mx_hosts=mx_hosts,
-        smtp_result=smtp_result,
-    )
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        yield from iter(mm.readline, b"")
 
 
-def _iter_emails_from_file(path: str) -> list[str]:
-    out: list[str] = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            addr = _extract_email(line)
+def _iter_emails_from_file(path: str) -> Iterator[str]:
+    with open(path, "rb") as f:
+        for line in _iter_lines(f):
+            addr = _extract_email(line.decode("utf-8", "ignore"))
             if addr:
-                out.append(addr)
-    return out
+                yield addr
+
+
+def _make_telegram_conn(timeout_s: float) -> http.client.HTTPSConnection:
+    proxy = urllib.request.getproxies().get("https")
+    if not proxy or urllib.request.proxy_bypass(_TG_HOST):
+        return http.client.HTTPSConnection(_TG_HOST, timeout=timeout_s)
+
+    parsed = urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    default_port = 443 if parsed.scheme == "https" else 80
+    conn = http.client.HTTPSConnection(parsed.hostname, parsed.port or default_port, timeout=timeout_s)
+
+    headers = {}
+    if parsed.username:
+        creds = f"{urllib.parse.unquote(parsed.username)}:{urllib.parse.unquote(parsed.password or '')}"
+        headers["Proxy-Authorization"] = "Basic " + base64.b64encode(creds.encode("utf-8")).decode("ascii")
+
+    conn.set_tunnel(_TG_HOST, 443, headers=headers)
+    return conn
+
+
+def _telegram_conn(timeout_s: float) -> http.client.HTTPSConnection:
+    global _TG_CONN
+
+    if _TG_CONN is None:
+        _TG_CONN = _make_telegram_conn(timeout_s=timeout_s)
+
+    _TG_CONN.timeout = timeout_s
+    if _TG_CONN.sock is not None:
+        _TG_CONN.sock.settimeout(timeout_s)
+    return _TG_CONN
+
+
+def _json_dumps(obj: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _json_loads(raw: bytes) -> dict:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
 
 
 def telegram_send_message(bot_token: str, chat_id: str, text: str, timeout_s: float) -> None:
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    path = f"/bot{bot_token}/sendMessage"
 
     payload = {
         "chat_id": chat_id,
@@ -210,16 +672,26 @@ def telegram_send_message(bot_token: str, chat_id: str, text: str, timeout_s: fl
         "disable_web_page_preview": True,
     }
 
-    data = urllib.parse.urlencode(payload).encode("utf-8")
-    req = urllib.request.Request(url, data=data, method="POST")
+    data = _json_dumps(payload)
+    headers = {"Content-Type": "application/json"}
+
+    for attempt in range(2):
+        conn = _telegram_conn(timeout_s=timeout_s)
+        reused = conn.sock is not None
 
-    with urllib.request.urlopen(req, timeout=timeout_s) as resp:
-        raw = resp.read().decode("utf-8")
+        try:
+            conn.request("POST", path, body=data, headers=headers)
+            raw = conn.getresponse().read()
+            break
+        except (http.client.HTTPException, ConnectionError):
+            conn.close()
+            if not reused or attempt:
+                raise
 
     try:
-        parsed = json.loads(raw)
+        parsed = _json_loads(raw)
     except json.JSONDecodeError:
-        raise RuntimeError(f"Telegram API returned non-JSON response: {raw[:200]}")
+        raise RuntimeError(f"Telegram API returned non-JSON response: {raw[:200].decode('utf-8', 'replace')}")
 
     if not parsed.get("ok"):
         raise RuntimeError(f"Telegram API error: {parsed}")
@@ -233,31 +705,94 @@ def _read_text_file(path: str) -> str:
         raise FileNotFoundError(f"File not found: {path}") from e
 
 
-def cmd_email_check(args: argparse.Namespace) -> int:
-    emails = _iter_emails_from_file(args.input)
-    if not emails:
-        print("No valid emails found in input", file=sys.stderr)
-        return 2
+def _format_result(res: EmailCheckResult) -> bytes:
+    hosts = res.mx_hosts
+    mx_preview = ",".join(hosts[:3]) + (",..." if len(hosts) > 3 else "")
+    return _RESULT_FMT(res.email, res.status, mx_preview, res.smtp_result).encode("utf-8")
+
+
+def _group_by_domain(emails: Iterable[str]) -> dict[str, list[str]]:
+    groups: dict[str, list[str]] = {}
+    for email in emails:
+        groups.setdefault(email.rsplit("@", 1)[1], []).append(email)
+    return groups
 
-    for e in emails:
-        res = check_email(
-            email=e,
-            dns_timeout_s=args.dns_timeout,
-            smtp_timeout_s=args.smtp_timeout,
+
+async def _run_checks(emails: list[str], args: argparse.Namespace) -> None:
+    serial = args.concurrency == 1
+    sem = asyncio.Semaphore(1 if serial else max(args.concurrency, _DNS_CONCURRENCY))
+
+    smtp_pool = None
+    if not args.no_smtp:
+        smtp_pool = SMTPPool(
+            timeout_s=args.smtp_timeout,
             helo_host=args.helo_host,
             mail_from=args.mail_from,
-            do_smtp=not args.no_smtp,
+            max_connections=args.concurrency,
+            rcpt_delay_s=args.sleep if serial else 0.0,
         )
 
-        mx_preview = ",".join(res.mx_hosts[:3])
-        if len(res.mx_hosts) > 3:
-            mx_preview += ",..."
+    async def run_domain(domain: str, addresses: list[str]) -> list[EmailCheckResult]:
+        async with sem:
+            results = await check_domain(domain, addresses, dns_timeout_s=args.dns_timeout, smtp_pool=smtp_pool)
+            if serial and args.sleep > 0:
+                await asyncio.sleep(args.sleep)
+            return results
 
-        print(f"{res.email}\t{res.status}\tmx=[{mx_preview}]\tsmtp={res.smtp_result}", flush=True)
+    out = sys.stdout.buffer
+    unflushed = 0
 
-        if args.sleep > 0:
-            time.sleep(args.sleep)
+    done: asyncio.Queue[asyncio.Task] = asyncio.Queue()
+
+    try:
+        tasks = [asyncio.create_task(run_domain(d, addrs)) for d, addrs in _group_by_domain(emails).items()]
+        for task in tasks:
+            task.add_done_callback(done.put_nowait)
+
+        for _ in tasks:
+            if unflushed and (done.empty() or unflushed >= _FLUSH_EVERY):
+                out.flush()
+                unflushed = 0
+
+            for res in (await done.get()).result():
+                out.write(_format_result(res))
+                unflushed += 1
+    finally:
+        out.flush()
+        if smtp_pool is not None:
+            await smtp_pool.close()
+
+
+def _run_async(main: Awaitable[T]) -> T:
+    if uvloop is not None:
+        return uvloop.run(main)
+    return asyncio.run(main)
+
+
+def cmd_email_check(args: argparse.Namespace) -> int:
+    if args.concurrency < 1:
+        print("--concurrency must be at least 1", file=sys.stderr)
+        return 2
+
+    helo_host = _smtp_host(args.helo_host)
+    if helo_host is None:
+        print(f"Invalid --helo-host: {args.helo_host!r}", file=sys.stderr)
+        return 2
+
+    mail_from = _smtp_address(args.mail_from) if args.mail_from else ""
+    if mail_from is None:
+        print(f"Invalid --mail-from: {args.mail_from!r}", file=sys.stderr)
+        return 2
+
+    args.helo_host = helo_host
+    args.mail_from = mail_from
+
+    emails = list(_iter_emails_from_file(args.input))
+    if not emails:
+        print("No valid emails found in input", file=sys.stderr)
+        return 2
 
+    _run_async(_run_checks(emails, args))
     return 0
 
 
@@ -304,6 +839,7 @@ def cmd_all(args: argparse.Namespace) -> int:
         helo_host=args.helo_host,
         mail_from=args.mail_from,
         sleep=args.sleep,
+        concurrency=args.concurrency,
     )
     code_email = cmd_email_check(email_args)
     if code_email != 0:
@@ -330,7 +866,8 @@ def main() -> int:
     p_email.add_argument("--no-smtp", action="store_true", help="Skip SMTP handshake step")
     p_email.add_argument("--helo-host", default="localhost")
     p_email.add_argument("--mail-from", default="no-reply@example.com")
-    p_email.add_argument("--sleep", type=float, default=0.0, help="Sleep between checks (seconds)")
+    p_email.add_argument("--sleep", type=float, default=0.0, help="Sleep between SMTP probes and between domains (seconds, only with --concurrency 1)")
+    p_email.add_argument("--concurrency", type=int, default=32, help="Max parallel SMTP handshakes")
     p_email.set_defaults(func=cmd_email_check)
 
     p_tg = sub.add_parser("telegram-send", help="Send text from .txt file to Telegram chat")
@@ -348,7 +885,8 @@ def main() -> int:
     p_all.add_argument("--no-smtp", action="store_true", help="Skip SMTP handshake step")
     p_all.add_argument("--helo-host", default="localhost")
     p_all.add_argument("--mail-from", default="no-reply@example.com")
-    p_all.add_argument("--sleep", type=float, default=0.0, help="Sleep between checks (seconds)")
+    p_all.add_argument("--sleep", type=float, default=0.0, help="Sleep between SMTP probes and between domains (seconds, only with --concurrency 1)")
+    p_all.add_argument("--concurrency", type=int, default=32, help="Max parallel SMTP handshakes")
     p_all.add_argument("--message-file", required=True, help="Path to .txt file")
     p_all.add_argument("--bot-token", default="", help="Telegram bot token (or set TELEGRAM_BOT_TOKEN env var)")
     p_all.add_argument("--chat-id", default="", help="Target chat_id (or set TELEGRAM_CHAT_ID env var)")